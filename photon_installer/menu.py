@@ -56,8 +56,13 @@ class Menu(Action):
         else:
             menu_win_width = self.width
 
+        # refresh() colors, looked up once
+        self.color_selected = curses.color_pair(1)
+        self.color_normal = curses.color_pair(2)
+        self.color_active = curses.color_pair(3)
+
         self.window = curses.newwin(self.height, menu_win_width)
-        self.window.bkgd(' ', curses.color_pair(2))
+        self.window.bkgd(' ', self.color_normal)
 
         self.window.keypad(1)
         self.panel = curses.panel.new_panel(self.window)
@@ -133,11 +138,11 @@ class Menu(Action):
                 continue
             elif index == self.position:
                 if highligh:
-                    mode = curses.color_pair(3)
+                    mode = self.color_active
                 else:
-                    mode = curses.color_pair(1)
+                    mode = self.color_selected
             else:
-                mode = curses.color_pair(2)
+                mode = self.color_normal
 
             if self.selector_menu:
                 if index in self.selected_items:
@@ -160,10 +165,11 @@ class Menu(Action):
         curses.panel.update_panels()
         curses.doupdate()
 
-    def hide(self):
+    def hide(self, flush=True):
         self.panel.hide()
         curses.panel.update_panels()
-        curses.doupdate()
+        if flush:
+            curses.doupdate()
 
     def do_action(self):
         while True:
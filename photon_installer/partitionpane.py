@@ -47,8 +47,12 @@ class PartitionPane(Action):
                     (self.text_height - self.filled) == (i - 1)):
                 self.filled -= 1
 
+        # menu item colors used by refresh()
+        self.color_normal = curses.color_pair(2)
+        self.color_active = curses.color_pair(3)
+
         self.window = curses.newwin(height, self.width)
-        self.window.bkgd(' ', curses.color_pair(2))
+        self.window.bkgd(' ', self.color_normal)
         self.popupWindow = True
 
         self.window.keypad(1)
@@ -152,9 +156,9 @@ class PartitionPane(Action):
         xpos = self.width
         for index, item in enumerate(self.menu_items):
             if index == self.menu_position:
-                mode = curses.color_pair(3)
+                mode = self.color_active
             else:
-                mode = curses.color_pair(2)
+                mode = self.color_normal
             self.window.addstr(self.text_height + 3, xpos - len(item[0]) - 4, item[0], mode)
             xpos = xpos - len(item[0]) - 4
 
@@ -168,10 +172,11 @@ class PartitionPane(Action):
         curses.panel.update_panels()
         curses.doupdate()
 
-    def hide(self):
+    def hide(self, flush=True):
         self.panel.hide()
         curses.panel.update_panels()
-        curses.doupdate()
+        if flush:
+            curses.doupdate()
 
     def do_action(self):
         while True:
@@ -24,6 +24,10 @@ class ProgressBar(object):
 
         self.width = width - 1
 
+        # colors of the completed and remaining parts of the bar
+        self.color_completed = curses.color_pair(3)
+        self.color_remaining = curses.color_pair(1)
+
         self.window = curses.newwin(5, width)
         self.window.bkgd(' ', curses.color_pair(2)) #defaultbackground color
         self.progress = 0
@@ -101,8 +105,8 @@ class ProgressBar(object):
         completed_width = completed * self.width // 100
         completed_str, remaining_str = self.get_spaces(completed_width, self.width, completed)
 
-        self.window.addstr(0, 0, completed_str, curses.color_pair(3))
-        self.window.addstr(0, completed_width, remaining_str, curses.color_pair(1))
+        self.window.addstr(0, 0, completed_str, self.color_completed)
+        self.window.addstr(0, completed_width, remaining_str, self.color_remaining)
         self.window.refresh()
 
     def render_time(self):
@@ -63,7 +63,7 @@ class ReadMulText(Action):
         else:
             self.accepted_chars = range(32, 127)
 
-    def hide(self):
+    def hide(self, flush=True):
         return
 
     def init_text(self):
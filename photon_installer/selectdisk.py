@@ -13,6 +13,10 @@ from actionresult import ActionResult
 from menu import Menu
 
 class SelectDisk(object):
+    # The menu callbacks always return the same results, share them
+    RESULT_OK = ActionResult(True, None)
+    RESULT_BAD_INDEX = ActionResult(False, None)
+
     def __init__(self, maxy, maxx, install_config):
         self.install_config = install_config
         self.menu_items = []
@@ -74,13 +78,15 @@ class SelectDisk(object):
         return self.window.do_action()
 
     def save_index(self, device_index):
+        if not 0 <= device_index < len(self.devices):
+            return SelectDisk.RESULT_BAD_INDEX
         self.install_config['disk'] = self.devices[device_index].path
-        return ActionResult(True, None)
+        return SelectDisk.RESULT_OK
 
     def auto_function(self):    #default is no partition
         self.install_config['autopartition'] = True
-        return ActionResult(True, None)
+        return SelectDisk.RESULT_OK
 
     def custom_function(self):  #custom minimize partition number is 1
         self.install_config['autopartition'] = False
-        return ActionResult(True, None)
+        return SelectDisk.RESULT_OK
@@ -39,8 +39,12 @@ class TextPane(Action):
                     (self.text_height - self.filled) == (i - 1)):
                 self.filled -= 1
 
+        # menu item colors used by refresh()
+        self.color_normal = curses.color_pair(2)
+        self.color_active = curses.color_pair(3)
+
         self.window = curses.newwin(height, self.width)
-        self.window.bkgd(' ', curses.color_pair(2))
+        self.window.bkgd(' ', self.color_normal)
         self.popupWindow = False
 
         self.window.keypad(1)
@@ -53,11 +57,9 @@ class TextPane(Action):
     def read_file(self, text_file_path, line_width):
         with open(text_file_path, "rb") as f:
             for line in f:
+                # latin1 maps every byte, so decoding cannot fail.
+                line = line.decode(encoding='latin1')
                 # expand tab to 8 spaces.
-                try:
-                    line = line.decode(encoding='latin1')
-                except UnicodeDecodeError:
-                    pass
                 line = line.expandtabs()
                 indent = len(line) - len(line.lstrip())
                 actual_line_width = line_width - indent
@@ -129,23 +131,18 @@ class TextPane(Action):
 
     def refresh(self):
         self.window.erase()
-        for index, line in enumerate(self.lines):
-            if index < self.head_position:
-                continue
-            elif index > self.head_position + self.text_height - 1:
-                continue
-
-            x = 0
-            y = index - self.head_position
-            if len(line) > 0:
-                self.window.addstr(y, x, line)
+        # Lines are already padded to the pane width, only draw the visible ones
+        visible_lines = self.lines[self.head_position:self.head_position + self.text_height]
+        for y, line in enumerate(visible_lines):
+            if line:
+                self.window.addstr(y, 0, line)
 
         xpos = self.width
         for index, item in enumerate(self.menu_items):
             if index == self.menu_position:
-                mode = curses.color_pair(3)
+                mode = self.color_active
             else:
-                mode = curses.color_pair(2)
+                mode = self.color_normal
             self.window.addstr(self.text_height + 1, xpos - len(item[0]) - 4, item[0], mode)
             xpos = xpos - len(item[0]) - 4
 
@@ -157,10 +154,11 @@ class TextPane(Action):
         curses.panel.update_panels()
         curses.doupdate()
 
-    def hide(self):
+    def hide(self, flush=True):
         self.panel.hide()
         curses.panel.update_panels()
-        curses.doupdate()
+        if flush:
+            curses.doupdate()
 
     def do_action(self):
         while True:
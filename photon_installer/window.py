@@ -7,10 +7,29 @@
 #    Author: Mahmoud Bassiouny <mbassiouny@vmware.com>
 
 import curses
+from collections import namedtuple
 from actionresult import ActionResult
 from action import Action
 
+GO_BACK_LABEL = '<Go Back>'
+GO_BACK_LEN = len(GO_BACK_LABEL)
+NEXT_LABEL = '<Next>'
+
+# A button on the Window row, built from the (label, action, flag) tuples
+# callers pass in, with the label length kept for the layout
+MenuItem = namedtuple('MenuItem', ['label', 'action', 'flag', 'label_len'])
+
+def make_menu_item(item):
+    flag = item[2] if len(item) > 2 else None
+    return MenuItem(item[0], item[1], flag, len(item[0]))
+
 class Window(Action):
+    # Shared results without payload, nothing modifies them
+    RESULT_OK = ActionResult(True, None)
+    RESULT_CANCEL = ActionResult(False, None)
+    # Hidden (shadowwin, shadowpanel) pairs by window size. A shadow is only
+    # needed while a window is shown, so windows of the same size share them.
+    shadow_pool = {}
 
     def __init__(self, height, width, maxy, maxx, title, can_go_back,
                  action_panel=None, items=None, menu_helper=None, position=0,
@@ -21,319 +40,407 @@ class Window(Action):
         self.width = width
         self.y = (maxy - height) // 2
         self.x = (maxx - width) // 2
-        title = ' ' + title + ' '
 
-        self.contentwin = curses.newwin(height - 1, width -1)
-        self.contentwin.bkgd(' ', curses.color_pair(2)) #Default Window color
-        self.contentwin.erase()
-        self.contentwin.box()
+        # Attributes used on every redraw, color_pair() only depends on the pair number
+        self.color_selected = curses.color_pair(1)
+        self.color_active = curses.color_pair(3)
+        self.color_error = curses.color_pair(4)
+        self.color_normal = curses.color_pair(2) #Default Window color
+        # rows of the button bar in contentwin and of the error line in textwin,
+        # and the blank line written by clearerror(), the size never changes
+        self.row_y = height - 3
+        self.error_y = height - 7
+        self.error_blank = ' ' * (width - 6)
+        # set by adderror(), clearerror() has nothing to do while it is False
+        self.error_shown = False
+
+        self.title = ' ' + title + ' '
         self.tab_enabled = tab_enabled
         self.read_text = read_text
 
         self.position = position
+        # position << 1 | select of the button row as last drawn by refresh(),
+        # None when the row has to be redrawn
+        self.last_render = None
         if items:
-            self.items = items
+            self.items = [make_menu_item(item) for item in items]
         else:
             self.items = []
         self.menu_helper = menu_helper
-        self.contentwin.addstr(0, (width - 1 - len(title)) // 2, title)#
         newy = 5
 
-        if self.can_go_back:
-            self.contentwin.addstr(height - 3, 5, '<Go Back>')
         if self.can_go_next and self.can_go_back:
             self.update_next_item()
 
         self.dist = 0
+        # (label, x) of every item on the button row, fixed once laid out
+        self.item_layout = ()
 
         if len(self.items) > 0:
         #To select items, we need to identify up left right keys
 
-            self.dist = self.width-11
-            self.dist -= len('<Go Back>')
-            count = 0
-            for item in self.items:
-                self.dist -= len(item[0])
-                count += 1
-            self.dist = self.dist // count
-            self.contentwin.keypad(1)
-            newy += len('<Go Back>')
+            labels_len = sum(item.label_len for item in self.items)
+            self.dist = (self.width - 11 - GO_BACK_LEN - labels_len) // len(self.items)
+            newy += GO_BACK_LEN
             newy += self.dist
+            item_layout = []
             for item in self.items:
-                self.contentwin.addstr(height - 3, newy, item[0])
-                newy += len(item[0])
+                item_layout.append((item.label, newy))
+                newy += item.label_len
                 newy += self.dist
+            self.item_layout = tuple(item_layout)
+
+        # Highlight of the selection while the action panel has the focus:
+        # show user the last selected item, but if Go back is the only one
+        # shown, do not highlight at all
+        self.color_idle = self.color_selected if self.items else 0
+        # Go Back is position 0, the items follow it
+        self.position_max = len(self.item_layout)
+        # (x, length) of every button by position, and the length of the row
+        # from Go Back to the end of the last item. The labels are drawn once,
+        # refresh() only changes their attributes.
+        self.row_slots = ((5, GO_BACK_LEN),) + tuple(
+            (x, len(label)) for label, x in self.item_layout)
+        x, length = self.row_slots[-1]
+        self.row_len = x + length - 5
+
+        self.action_panel = action_panel
+        self.key_handlers = {
+            curses.KEY_ENTER: self._on_enter,
+            ord('\n'): self._on_enter,
+            ord('\t'): self._on_tab,
+            curses.KEY_UP: self._on_up,
+            curses.KEY_LEFT: self._on_left,
+            curses.KEY_DOWN: self._on_down,
+            curses.KEY_RIGHT: self._on_right,
+        }
+        # curses windows and panels are created on first use, see build_windows()
+        self.built = False
+        self.visible = False
+        # getch() timeout in ms while waiting for a key, on_idle() is called
+        # every time it expires. The default -1 blocks until a key is pressed.
+        self.idle_timeout = -1
+
+    def build_windows(self):
+        if self.built:
+            return
+        self.built = True
+        height = self.height
+        width = self.width
+
+        self.contentwin = curses.newwin(height - 1, width -1)
+        self.contentwin.bkgd(' ', self.color_normal) #Default Window color
+        self.contentwin.erase()
+        self.contentwin.box()
+        self.contentwin.addstr(0, (width - 1 - len(self.title)) // 2, self.title)#
+
+        if self.item_layout:
+            self.contentwin.keypad(1)
+        if self.can_go_back or self.item_layout:
+            # compose the whole button row and draw it with a single addstr
+            row = GO_BACK_LABEL if self.can_go_back else ' ' * GO_BACK_LEN
+            for label, x in self.item_layout:
+                row = row[:x - 5].ljust(x - 5) + label
+            self.contentwin.addstr(self.row_y, 5, row)
 
         self.textwin = curses.newwin(height - 5, width - 5)
-        self.textwin.bkgd(' ', curses.color_pair(2)) #Default Window color
+        self.textwin.bkgd(' ', self.color_normal) #Default Window color
 
-        self.shadowwin = curses.newwin(height - 1, width - 1)
-        self.shadowwin.bkgd(' ', curses.color_pair(0)) #Default shadow color
+        # taken from shadow_pool while the window is shown
+        self.shadowwin = None
+        self.shadowpanel = None
 
+        # new panels are put on top of the stack, keep them hidden until
+        # show_window(). The window never moves, place the panels once.
         self.contentpanel = curses.panel.new_panel(self.contentwin)
         self.textpanel = curses.panel.new_panel(self.textwin)
-        self.shadowpanel = curses.panel.new_panel(self.shadowwin)
-
-        self.action_panel = action_panel
-#        self.refresh(0, True)
-        self.hide_window()
+        self.contentpanel.hide()
+        self.textpanel.hide()
+        self.contentpanel.move(self.y, self.x)
+        self.textpanel.move(self.y + 2, self.x + 2)
 
     def update_next_item(self):
         self.position = 1
-        self.items.append(('<Next>', self.next_function, False))
+        self.items.append(make_menu_item((NEXT_LABEL, self.next_function, False)))
         self.tab_enabled = False
+        self.last_render = None
 
 
     def next_function(self):
-        return ActionResult(True, None)
+        return Window.RESULT_OK
 
     def set_action_panel(self, action_panel):
         self.action_panel = action_panel
 
     def update_menu(self, action_result):
-        if (action_result.result and
-                'goNext' in action_result.result and
-                action_result.result['goNext']):
-            return ActionResult(True, None)
+        res = action_result.result or {}
+        if res.get('goNext'):
+            return Window.RESULT_OK
         if self.position == 0:
-            self.contentwin.addstr(self.height - 3, 5, '<Go Back>')
-            self.contentwin.refresh()
-            self.hide_window()
-            self.action_panel.hide()
-            return ActionResult(False, None)
-        else:
-            if (action_result.result != None and
-                    'diskIndex' in action_result.result):
-                params = action_result.result['diskIndex']
-                if self.menu_helper:
-                    self.menu_helper(params)
-
-            result = self.items[self.position-1][1]()
-            if result.success:
-                self.hide_window()
-                self.action_panel.hide()
-                return result
-            else:
-                if 'goBack' in result.result and result.result['goBack']:
-                    self.contentwin.refresh()
-                    self.hide_window()
-                    self.action_panel.hide()
-                    return ActionResult(False, None)
+            # the row is restyled by refresh() next time the window is shown
+            return self._close(Window.RESULT_CANCEL)
+
+        disk_index = res.get('diskIndex')
+        if disk_index is not None and self.menu_helper:
+            self.menu_helper(disk_index)
+
+        result = self.items[self.position-1].action()
+        if result.success:
+            return self._close(result)
+        if (result.result or {}).get('goBack'):
+            return self._close(Window.RESULT_CANCEL)
+        return None
+
+    def _close(self, action_result):
+        # Leave the window: hide it together with its action panel, then
+        # write both changes out at once
+        self.hide_window(flush=False)
+        self.action_panel.hide(flush=False)
+        self._flush()
+        return action_result
+
+    def _finish(self, action_result):
+        # The action panel succeeded, run the selected item if there are any
+        if self.items:
+            return self.update_menu(action_result)
+        self.hide_window()
+        return action_result
 
     def do_action(self):
-        self.show_window()
+        # refresh() below redraws the row and flushes when there is one
+        self.show_window(flush=not self.can_go_back)
         if self.tab_enabled:
             self.refresh(0, False)
         else:
             self.refresh(0, True)
+        done, action_result = self._on_start()
+
+        self.contentwin.timeout(self.idle_timeout)
+        # none of these change while the window is active
+        read_text = self.read_text
+        getch = self.contentwin.getch
+        get_handler = self.key_handlers.get
+        while not done:
+            if read_text:
+                done, action_result = self._on_read_text(action_result)
+                continue
+            key = getch()
+            if key == -1:
+                self.on_idle()
+                continue
+            handler = get_handler(key)
+            if handler is not None:
+                done, action_result = handler(key, action_result)
+        return action_result
+
+    def on_idle(self):
+        # Called when no key arrived within idle_timeout, override to update
+        # the window while waiting for input
+        pass
+
+    # Steps of do_action(). Each returns (done, action_result): done tells
+    # do_action() to return action_result, otherwise it keeps going with
+    # action_result as the latest panel result.
+    def _on_start(self):
         action_result = self.action_panel.do_action()
+        res = action_result.result or {}
 
         if action_result.success:
-            if (action_result.result and
-                    'goNext' in action_result.result and
-                    action_result.result['goNext']):
-                return ActionResult(True, None)
+            if res.get('goNext'):
+                return True, Window.RESULT_OK
             if self.position != 0:    #saving the disk index
-                self.items[self.position-1][1]()
-            if self.items:
-                return self.update_menu(action_result)
+                self.items[self.position-1].action()
+            return True, self._finish(action_result)
+
+        direction = res.get('direction')
+        if not self.tab_enabled and direction is not None:
+            self.refresh(direction, True)
+        if res.get('goBack'):
+            return True, self._close(action_result)
+        #highlight the GoBack and keep going
+        self.refresh(0, True)
+        return False, action_result
+
+    def _on_read_text(self, action_result):
+        is_go_back = self.position == 0
+        action_result = self.action_panel.do_action(returned=True, go_back=is_go_back)
+        res = action_result.result or {}
+        if action_result.success:
+            return True, self._finish(action_result)
+        if res.get('goBack'):
+            return True, self._close(action_result)
+        direction = res.get('direction')
+        if direction is not None:
+            self.refresh(direction, True)
+        return False, action_result
+
+    # Key handlers, same convention as the steps above
+    def _on_enter(self, key, action_result):
+        result = self.update_menu(action_result)
+        if result is None:
+            return False, action_result
+        return True, result
+
+    def _on_tab(self, key, action_result):
+        if not self.tab_enabled:
+            return False, action_result
+        #remove highlight from Go Back
+        self.refresh(0, False)
+        # go do the action inside the panel
+        action_result = self.action_panel.do_action()
+        if action_result.success:
             self.hide_window()
-            return action_result
-        else:
-            if (not self.tab_enabled and
-                    action_result.result != None and
-                    'direction' in action_result.result):
-                self.refresh(action_result.result['direction'], True)
-            if (action_result.result != None and
-                    'goBack' in action_result.result
-                    and action_result.result['goBack']):
-                self.hide_window()
-                self.action_panel.hide()
-                return action_result
-            else:
-                #highlight the GoBack and keep going
-                self.refresh(0, True)
-
-        while action_result.success == False:
-            if self.read_text:
-                is_go_back = self.position == 0
-                action_result = self.action_panel.do_action(returned=True, go_back=is_go_back)
-                if action_result.success:
-                    if self.items:
-                        return self.update_menu(action_result)
-                    self.hide_window()
-                    return action_result
-                else:
-                    if (action_result.result != None and
-                            'goBack' in action_result.result and
-                            action_result.result['goBack']):
-                        self.hide_window()
-                        self.action_panel.hide()
-                        return action_result
-                    if action_result.result and 'direction' in action_result.result:
-                        self.refresh(action_result.result['direction'], True)
-            else:
-                key = self.contentwin.getch()
-                if key in [curses.KEY_ENTER, ord('\n')]:
-                    #remove highlight from Go Back
-                    if self.position == 0:
-                        self.contentwin.addstr(self.height - 3, 5, '<Go Back>')
-                        self.contentwin.refresh()
-                        self.hide_window()
-                        self.action_panel.hide()
-                        return ActionResult(False, None)
-                    else:
-                        if (action_result.result != None and
-                                'diskIndex' in action_result.result):
-                            params = action_result.result['diskIndex']
-                            if self.menu_helper:
-                                self.menu_helper(params)
-                        result = self.items[self.position-1][1]()
-                        if result.success:
-                            self.hide_window()
-                            self.action_panel.hide()
-                            return result
-                        else:
-                            if 'goBack' in result.result and result.result['goBack']:
-                                self.contentwin.refresh()
-                                self.hide_window()
-                                self.action_panel.hide()
-                                return ActionResult(False, None)
-                elif key in [ord('\t')]:
-                    if not self.tab_enabled:
-                        continue
-                    #remove highlight from Go Back
-                    self.refresh(0, False)
-                    # go do the action inside the panel
-                    action_result = self.action_panel.do_action()
-                    if action_result.success:
-                        self.hide_window()
-                        return action_result
-                    else:
-                        #highlight the GoBack and keep going
-                        self.refresh(0, True)
-                elif key == curses.KEY_UP or key == curses.KEY_LEFT:
-                    if key == curses.KEY_UP and self.tab_enabled == False:
-                        self.action_panel.navigate(-1)
-                        action_result = self.action_panel.do_action()
-                        if action_result.success:
-                            if self.items:
-                                return self.update_menu(action_result)
-                            self.hide_window()
-                            return action_result
-                        else:
-                            if 'direction' in action_result.result:
-                            #highlight the GoBack and keep going
-                                self.refresh(action_result.result['direction'], True)
-                    else:
-                        self.refresh(-1, True)
-
-                elif key == curses.KEY_DOWN or key == curses.KEY_RIGHT:
-                    if key == curses.KEY_DOWN and self.tab_enabled == False:
-                        self.action_panel.navigate(1)
-                        action_result = self.action_panel.do_action()
-                        if action_result.success:
-                            if self.items:
-                                return self.update_menu(action_result)
-                            self.hide_window()
-                            return action_result
-                        else:
-                            if 'direction' in action_result.result:
-                            #highlight the GoBack and keep going
-                                self.refresh(action_result.result['direction'], True)
-                    else:
-                        self.refresh(1, True)
+            return True, action_result
+        #highlight the GoBack and keep going
+        self.refresh(0, True)
+        return False, action_result
+
+    def _on_up(self, key, action_result):
+        return self._on_navigate(key, -1, True, action_result)
 
+    def _on_left(self, key, action_result):
+        return self._on_navigate(key, -1, False, action_result)
+
+    def _on_down(self, key, action_result):
+        return self._on_navigate(key, 1, True, action_result)
+
+    def _on_right(self, key, action_result):
+        return self._on_navigate(key, 1, False, action_result)
+
+    def _on_navigate(self, key, n, vertical, action_result):
+        if not vertical or self.tab_enabled:
+            # move over every press of this key that is already waiting at once
+            self.refresh(n * (1 + self._pending_repeats(key)), True)
+            return False, action_result
+
+        # up/down move inside the action panel when tab is disabled
+        self.action_panel.navigate(n)
+        action_result = self.action_panel.do_action()
+        if action_result.success:
+            return True, self._finish(action_result)
+        direction = (action_result.result or {}).get('direction')
+        if direction is not None:
+            #highlight the GoBack and keep going
+            self.refresh(direction, True)
+        return False, action_result
+
+    def _pending_repeats(self, key):
+        # Count and consume the presses of key that were typed ahead (e.g. by
+        # auto-repeat), the first other key is pushed back for the key loop
+        count = 0
+        self.contentwin.timeout(0)
+        next_key = self.contentwin.getch()
+        while next_key == key:
+            count += 1
+            next_key = self.contentwin.getch()
+        self.contentwin.timeout(self.idle_timeout)
+        if next_key != -1:
+            curses.ungetch(next_key)
+        return count
 
     def refresh(self, n, select):
         if not self.can_go_back:
             return
-        self.position += n
-        if self.position < 0:
-            self.position = 0
-        elif self.items and self.position > len(self.items):  #add 1 for the <go back>
-            self.position = len(self.items)
-
-        if not self.items and not self.can_go_next:
-            self.position = 0
-        #add the highlight
-        newy = 5
-        if self.position == 0:   #go back
-            if select:
-                self.contentwin.addstr(self.height - 3, 5, '<Go Back>', curses.color_pair(3))
-            elif self.items: #show user the last selected items
-                self.contentwin.addstr(self.height - 3, 5, '<Go Back>', curses.color_pair(1))
-            else: #if Go back is the only one shown, do not highlight at all
-                self.contentwin.addstr(self.height - 3, 5, '<Go Back>')
-
-            newy += len('<Go Back>')
-            newy += self.dist
+        self.position = min(max(self.position + n, 0), self.position_max)
 
-            if self.items:
-                for item in self.items:
-                    self.contentwin.addstr(self.height - 3, newy, item[0])
-                    newy += len(item[0])
-                    newy += self.dist
+        # Nothing to redraw if the row already shows this state
+        state = self.position << 1 | (1 if select else 0)
+        last_render = self.last_render
+        if state == last_render:
+            return
+        self.last_render = state
 
+        y = self.row_y
+        if last_render is None:
+            self.contentwin.chgat(y, 5, self.row_len, self.color_normal)
         else:
-            self.contentwin.addstr(self.height - 3, 5, '<Go Back>')
-            newy += len('<Go Back>')
-            newy += self.dist
-            index = 1
-            for item in self.items:
-                if index == self.position:
-                    if select:
-                        self.contentwin.addstr(self.height - 3, newy, item[0], curses.color_pair(3))
-                    else:
-                        self.contentwin.addstr(self.height - 3, newy, item[0], curses.color_pair(1))
-
-                else:
-                    self.contentwin.addstr(self.height - 3, newy, item[0])
-                newy += len(item[0])
-                newy += self.dist
-                index += 1
+            # only the previously selected button has to lose its highlight
+            x, length = self.row_slots[last_render >> 1]
+            self.contentwin.chgat(y, x, length, self.color_normal)
+
+        #add the highlight
+        highlight = self.color_active if select else self.color_idle
+        if highlight:
+            x, length = self.row_slots[self.position]
+            self.contentwin.chgat(y, x, length, highlight)
 
-        self.contentwin.refresh()
+        self.contentwin.noutrefresh()
+        self._flush()
 
-    def show_window(self):
-        y = self.y
-        x = self.x
-        self.shadowpanel.top()
-        self.contentpanel.top()
-        self.textpanel.top()
+    def _flush(self):
+        # Push every staged noutrefresh() to the terminal in one write
+        curses.doupdate()
 
-        self.shadowpanel.move(y + 1, x + 1)
-        self.contentpanel.move(y, x)
-        self.textpanel.move(y + 2, x + 2)
+    def show_window(self, flush=True):
+        self.build_windows()
+        self.last_render = None
+        if self.can_go_next:
+            self.position = 1
+        # Already shown and nothing was raised above it
+        if self.visible and curses.panel.top_panel() is self.textpanel:
+            return
+        self.visible = True
 
+        # show() also raises the panel to the top of the stack, so showing
+        # them in order leaves the text above the content above the shadow
+        if self.shadowpanel is None:
+            self._acquire_shadow()
         self.shadowpanel.show()
         self.contentpanel.show()
         self.textpanel.show()
 
         curses.panel.update_panels()
-        curses.doupdate()
-
-        if self.can_go_next:
-            self.position = 1
+        if flush:
+            self._flush()
 
-    def hide_window(self):
-        self.shadowpanel.hide()
-        self.contentpanel.hide()
-        self.textpanel.hide()
+    def hide_window(self, flush=True):
+        self.last_render = None
+        if not self.visible:
+            return
+        self.visible = False
+        for panel in (self.shadowpanel, self.contentpanel, self.textpanel):
+            panel.hide()
+        self._release_shadow()
         curses.panel.update_panels()
-        curses.doupdate()
+        if flush:
+            self._flush()
+
+    def _acquire_shadow(self):
+        size = (self.height - 1, self.width - 1)
+        free = Window.shadow_pool.get(size)
+        if free:
+            self.shadowwin, self.shadowpanel = free.pop()
+        else:
+            self.shadowwin = curses.newwin(*size)
+            self.shadowwin.bkgd(' ', curses.color_pair(0)) #Default shadow color
+            self.shadowpanel = curses.panel.new_panel(self.shadowwin)
+        self.shadowpanel.move(self.y + 1, self.x + 1)
+
+    def _release_shadow(self):
+        size = (self.height - 1, self.width - 1)
+        Window.shadow_pool.setdefault(size, []).append((self.shadowwin, self.shadowpanel))
+        self.shadowwin = None
+        self.shadowpanel = None
 
     def addstr(self, y, x, str, mode=0):
+        self.build_windows()
         self.textwin.addstr(y, x, str, mode)
 
     def adderror(self, str):
-        self.textwin.addstr(self.height - 7, 0, str, curses.color_pair(4))
-        self.textwin.refresh()
+        self.build_windows()
+        self.error_shown = True
+        self.textwin.addstr(self.error_y, 0, str, self.color_error)
+        self.textwin.noutrefresh()
+        self._flush()
 
     def clearerror(self):
-        spaces = ' ' * (self.width - 6)
-        self.textwin.addstr(self.height - 7, 0, spaces)
-        self.textwin.refresh()
+        if not self.error_shown:
+            return
+        self.error_shown = False
+        self.textwin.addstr(self.error_y, 0, self.error_blank)
+        self.textwin.noutrefresh()
+        self._flush()
 
     def content_window(self):
+        self.build_windows()
         return self.textwin